@@ -6,91 +6,409 @@ Dynamically executes USER test scripts with automatic step-by-step screenshot ca
 
 import os
 import sys
+import re
+import ast
+import mmap
+import time
+import signal
 import asyncio
-import subprocess
-import json
 import base64
-import requests
+import inspect
+import importlib.util
+import hashlib
+import tempfile
+import threading
+import traceback
+import collections
 from pathlib import Path
 from datetime import datetime
 
+# Screenshot settings (SCREENSHOT_TYPE/QUALITY env) and the hook file prefix, shared with the script hooks
+from runner_hooks import HOOK_SCREENSHOT_PREFIX, SCREENSHOT_TYPE, SCREENSHOT_QUALITY, SCREENSHOT_EXTENSION
+
+# requests is only imported by runs that send live logs to the backend
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+def dumps_json(obj, indent=False):
+    """Serialize to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode('utf-8')
+
+def loads_json(data):
+    """Parse JSON from bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Console section separators
+_BAR50 = "=" * 50
+_BAR60 = "=" * 60
+
+def print_block(*lines):
+    """Print several lines with one write so concurrent scripts cannot interleave them"""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+# Directories already created during this run
+_created_directories = set()
+
+async def ensure_directory(directory: Path):
+    """Create a directory off the event loop, at most once per run"""
+    if directory in _created_directories:
+        return
+    await asyncio.to_thread(directory.mkdir, parents=True, exist_ok=True)
+    _created_directories.add(directory)
+
 # Live logging configuration
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:5002")
 TEST_RUN_ID = os.getenv("TEST_RUN_ID", None)
 
+# Write test_results.json only when something reads it: CI, a backend test run, --json or RUNNER_EMIT_JSON=1 (0 turns it off)
+_emit_json_setting = os.getenv("RUNNER_EMIT_JSON")
+if "--json" in sys.argv[1:]:
+    EMIT_JSON = True
+elif _emit_json_setting is not None:
+    EMIT_JSON = _emit_json_setting == "1"
+else:
+    EMIT_JSON = bool(os.getenv("CI") or TEST_RUN_ID)
+
+# Live logs are sent in the background, batched at most every LOG_FLUSH_INTERVAL seconds
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.2"))
+LOG_BATCH_SIZE = max(1, int(os.getenv("LOG_BATCH_SIZE", "50")))
+
+# Logs waiting to be sent are capped; past the cap new ones are dropped and counted
+LOG_QUEUE_LIMIT = max(1, int(os.getenv("LOG_QUEUE_LIMIT", "1000")))
+
+# Script output is sent as one log per stream and flush, holding at most this many characters
+LOG_OUTPUT_CHARS = 2000
+
+# Longest the runner waits at exit for queued logs to reach the backend
+LOG_CLOSE_TIMEOUT = float(os.getenv("LOG_CLOSE_TIMEOUT", "10"))
+
+# Also echo live logs to the console when they are sent to the backend
+VERBOSE = os.getenv("VERBOSE", "0") == "1"
+
+def effective_cpu_count():
+    """CPUs this process can actually use: its affinity mask, capped by a cgroup v2 CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    
+    # os.cpu_count() reports the host; a container's quota is in cpu.max as "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, -(-int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+EFFECTIVE_CPUS = effective_cpu_count()
+
+# Maximum number of test scripts executed concurrently, defaulting to one per usable CPU
+MAX_PARALLEL = max(1, int(
+    os.getenv("RUNNER_MAX_CONCURRENCY") or os.getenv("MAX_PARALLEL") or EFFECTIVE_CPUS
+))
+
+# Maximum number of subprocess scripts running at once; each one launches its own Chromium
+MAX_BROWSER_PROCESSES = max(1, int(
+    os.getenv("RUNNER_PARALLEL") or EFFECTIVE_CPUS // 2
+))
+
+# Root directory for screenshot files, one subdirectory per script
+SCREENSHOTS_DIR = Path("screenshots")
+
+# Characters that are unsafe in screenshot file names, mapped to "_"
+_FILENAME_TRANSLATION = str.maketrans({
+    **{c: "_" for c in ' /\\:*?"<>|'},
+    **{chr(code): "_" for code in range(32)}
+})
+
+# Embed base64 screenshot data in test_results.json (off by default; files are referenced by path)
+INLINE_SCREENSHOTS = os.getenv("INLINE_SCREENSHOTS", "0") == "1" and EMIT_JSON
+
+# sha256 of every screenshot whose data-carrying record is already in the sink; later copies get a "ref" to it
+_inlined_screenshots = set()
+
+# Lines of stdout/stderr kept per script for the results file
+OUTPUT_TAIL_LINES = int(os.getenv("OUTPUT_TAIL_LINES", "200"))
+
+# Bytes kept of each tail line; the full line is only in the script's log file
+OUTPUT_TAIL_LINE_BYTES = 2000
+
+# Longest single line of script output read from a subprocess pipe
+STREAM_LINE_LIMIT = 1024 * 1024
+
+# Files in the working directory that are never treated as test scripts
+EXCLUDED_SCRIPTS = frozenset({"runner.py", "runner_worker.py", "runner_hooks.py"})
+
+# Subprocess scripts start through the worker, which installs the screenshot hooks from runner_hooks.py;
+# runner.py, runner_worker.py and runner_hooks.py are always deployed together
+WORKER_SCRIPT = Path(__file__).resolve().with_name("runner_worker.py")
+
+# Full stdout/stderr of each subprocess script; results only keep the tail
+SCRIPT_LOGS_DIR = Path("test-results")
+
+# Subprocess scripts run on interpreters that imported Playwright ahead of time (WARM_INTERPRETERS=0 disables)
+WARM_INTERPRETERS = os.getenv("WARM_INTERPRETERS", "1") == "1"
+
+# Launch arguments for the shared Chromium instance
+BROWSER_ARGS = ['--no-sandbox', '--disable-dev-shm-usage', '--window-size=1920,1080']
+
+# Options for every browser context opened on the shared browser
+CONTEXT_OPTIONS = {
+    "viewport": {"width": 1920, "height": 1080},
+    "ignore_https_errors": True
+}
+
+# Record a video of every in-process script context into videos/<script>/ (RECORD_VIDEO=1)
+RECORD_VIDEO = os.getenv("RECORD_VIDEO", "0") == "1"
+VIDEOS_DIR = Path("videos")
+
+# Time a timed-out or cancelled script gets to exit after SIGTERM before it is killed
+TERMINATE_GRACE_SECONDS = 5
+
+# Time left to read output still in a finished script's pipes once its process group is stopped
+OUTPUT_DRAIN_SECONDS = 5
+
+# How often a finished or terminated script's process group is checked for survivors
+PROCESS_POLL_SECONDS = 0.05
+
+# Longest a single script may run, plus slack for the whole run on top of the per-script bounds
+PER_TASK_TIMEOUT_SECONDS = float(os.getenv("PER_TASK_TIMEOUT_SECONDS", "600"))
+TASK_GATHER_BUFFER_SECONDS = float(os.getenv("TASK_GATHER_BUFFER_SECONDS", "60"))
+
+# Scratch space for files that only live for the run (RUNNER_TMP_DIR=/dev/shm opts into tmpfs;
+# container /dev/shm is often tiny, which is also why Chromium runs with --disable-dev-shm-usage)
+RUNNER_TMP_DIR = Path(os.getenv("RUNNER_TMP_DIR") or tempfile.gettempdir())
+
+# Append-only sink for screenshot records, merged into test_results.json at the end of the run
+SCREENSHOTS_SINK = RUNNER_TMP_DIR / f"testneo_screenshots_{os.getpid()}.jsonl"
+
+# test_results.json is written compactly; PRETTY_RESULTS=1 also writes an indented copy
+PRETTY_RESULTS = os.getenv("PRETTY_RESULTS", "0") == "1"
+PRETTY_RESULTS_FILE = Path("test_results.pretty.json")
+
+# Serializes writes to the shared results file across concurrent scripts
+_results_lock = None
+
+def get_results_lock():
+    """Return the results file lock, creating it inside the running event loop"""
+    global _results_lock
+    if _results_lock is None:
+        _results_lock = asyncio.Lock()
+    return _results_lock
+
+# Bounds concurrently running subprocess scripts to MAX_BROWSER_PROCESSES
+_browser_process_slots = None
+
+def get_browser_process_slots():
+    """Return the subprocess script semaphore, creating it inside the running event loop"""
+    global _browser_process_slots
+    if _browser_process_slots is None:
+        _browser_process_slots = asyncio.Semaphore(MAX_BROWSER_PROCESSES)
+    return _browser_process_slots
+
+class OutputBuffer:
+    """Lines from one script output stream that are sent together as a single live log"""
+    
+    def __init__(self):
+        self.lines = []
+        self.size = 0
+        self.omitted = 0
+        self.closed = False
+    
+    def add(self, line: str):
+        if self.size >= LOG_OUTPUT_CHARS:
+            self.omitted += 1
+            return
+        line = line[:LOG_OUTPUT_CHARS - self.size]
+        self.lines.append(line)
+        self.size += len(line) + 1
+    
+    def __str__(self):
+        text = "\n".join(self.lines)
+        if self.omitted:
+            text += f"\n... {self.omitted} more lines"
+        return text
+
 class LiveLogger:
     def __init__(self, test_run_id=None):
         self.test_run_id = test_run_id
         self.backend_url = BACKEND_URL
+        self.session = None
+        self.queue = None
+        self.flusher = None
+        self.output_buffers = {}
+        self.dropped = 0
+        self.stopped = False
         
     async def log(self, step_name: str, message: str, level: str = "info"):
-        """Send live log to backend"""
+        """Queue a live log for the backend, or print it when there is no test run"""
         if not self.test_run_id:
             print(f"[{level.upper()}] {step_name}: {message}")
             return
-            
+        
+        # The timestamp is only formatted when the batch is sent
+        self._enqueue((time.time(), step_name, message, level))
+    
+    async def log_output(self, source, step_name: str, line: str, level: str = "info"):
+        """Queue a line of script output, merged with the lines from the same source that are not sent yet"""
+        if not self.test_run_id:
+            print(f"[{level.upper()}] {step_name}: {line}")
+            return
+        
+        buffer = self.output_buffers.get(source)
+        if buffer is None or buffer.closed:
+            buffer = OutputBuffer()
+            if not self._enqueue((time.time(), step_name, buffer, level)):
+                return
+            self.output_buffers[source] = buffer
+        buffer.add(line)
+    
+    def end_output(self, source):
+        """Forget a finished output source"""
+        self.output_buffers.pop(source, None)
+    
+    def _enqueue(self, entry):
+        """Queue a log for the flusher, dropping it when the queue is full"""
+        # Start the background flusher and HTTP session on first use, inside the running event loop
+        if self.flusher is None:
+            import requests
+            self.session = requests.Session()
+            self.queue = asyncio.Queue(maxsize=LOG_QUEUE_LIMIT)
+            self.flusher = asyncio.create_task(self._flush_loop())
+        
         try:
+            self.queue.put_nowait(entry)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+    
+    async def _flush_loop(self):
+        """Collect queued logs into batches and send them off the event loop"""
+        while True:
+            batch = [await self.queue.get()]
+            self._fill_batch(batch)
+            # Only a partial batch waits for more logs; a backlog is sent back to back
+            if len(batch) < LOG_BATCH_SIZE:
+                await asyncio.sleep(LOG_FLUSH_INTERVAL)
+                self._fill_batch(batch)
+            
+            # Output that arrives from now on starts a new log
+            for _, _, message, _ in batch:
+                if isinstance(message, OutputBuffer):
+                    message.closed = True
+            
+            # Echo the whole batch with a single write instead of one print per log
+            if VERBOSE:
+                sys.stdout.write("".join(
+                    f"[{level.upper()}] {step_name}: {message}\n"
+                    for _, step_name, message, level in batch
+                ))
+                sys.stdout.flush()
+            
+            try:
+                await asyncio.to_thread(self._send_batch, batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    def _fill_batch(self, batch):
+        """Move queued logs into the batch, up to LOG_BATCH_SIZE"""
+        while len(batch) < LOG_BATCH_SIZE and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+    
+    def _send_batch(self, batch):
+        """Send a batch of logs to the backend API (runs in a worker thread)"""
+        url = f"{self.backend_url}/api/test-runs/{self.test_run_id}/live-log"
+        for timestamp, step_name, message, level in batch:
+            # close() gave up waiting; the rest of the batch is abandoned
+            if self.stopped:
+                return
             log_data = {
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": datetime.utcfromtimestamp(timestamp).isoformat(),
                 "step_name": step_name,
-                "message": message,
+                "message": str(message),
                 "level": level
             }
-            
-            # Send to backend API
-            response = requests.post(
-                f"{self.backend_url}/api/test-runs/{self.test_run_id}/live-log",
-                json=log_data,
-                timeout=5
-            )
-            
-            # Also print to console
-            print(f"[{level.upper()}] {step_name}: {message}")
-            
-        except Exception as e:
-            # Fallback to console logging
-            print(f"[{level.upper()}] {step_name}: {message}")
-            print(f"Warning: Failed to send live log: {e}")
+            try:
+                self.session.post(url, json=log_data, timeout=5)
+            except Exception as e:
+                print(f"Warning: Failed to send live log: {e}")
+    
+    async def close(self):
+        """Send pending logs for up to LOG_CLOSE_TIMEOUT, stop the background flusher and close the HTTP session"""
+        if self.flusher is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=LOG_CLOSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Gave up sending {self.queue.qsize()} queued live logs after {LOG_CLOSE_TIMEOUT:g}s")
+            self.stopped = True
+            if self.dropped:
+                print(f"⚠️ Dropped {self.dropped} live logs because the backend fell behind")
+            self.flusher.cancel()
+            try:
+                await self.flusher
+            except asyncio.CancelledError:
+                pass
+            self.flusher = None
+        
+        if self.session is not None:
+            self.session.close()
+            self.session = None
 
 # Global logger instance
 live_logger = LiveLogger(TEST_RUN_ID)
 
+def write_screenshot(screenshot_path: Path, screenshot_bytes: bytes):
+    """Save a screenshot and return its sha256; runs in a worker thread"""
+    screenshot_path.write_bytes(screenshot_bytes)
+    return hashlib.sha256(screenshot_bytes).hexdigest()
+
 class ScreenshotCapture:
     def __init__(self, script_name):
         self.script_name = script_name
         self.screenshot_counter = 0
         self.screenshots_data = []
+        self.inlined_hashes = set()
+        self.screenshot_dir = SCREENSHOTS_DIR / script_name
         
     async def capture(self, page, step_name, description=""):
         """Capture a screenshot with metadata"""
         try:
             self.screenshot_counter += 1
-            timestamp = datetime.now()
+            timestamp = time.time()
             
             # Create screenshot filename
-            screenshot_filename = f"{self.script_name}_step_{self.screenshot_counter:03d}_{step_name.replace(' ', '_')}.png"
-            screenshot_path = Path("screenshots") / self.script_name / screenshot_filename
-            screenshot_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Take full page screenshot
-            await page.screenshot(path=str(screenshot_path), full_page=True)
+            screenshot_filename = f"{self.script_name}_step_{self.screenshot_counter:03d}_{step_name.translate(_FILENAME_TRANSLATION)}{SCREENSHOT_EXTENSION}"
+            screenshot_path = self.screenshot_dir / screenshot_filename
+            await ensure_directory(self.screenshot_dir)
             
-            # Read and encode screenshot
-            with open(screenshot_path, 'rb') as f:
-                screenshot_data = base64.b64encode(f.read()).decode('utf-8')
+            # Take full page screenshot in memory and persist it off the event loop
+            screenshot_options = {"type": SCREENSHOT_TYPE, "full_page": True}
+            if SCREENSHOT_TYPE == "jpeg":
+                screenshot_options["quality"] = SCREENSHOT_QUALITY
+            screenshot_bytes = await page.screenshot(**screenshot_options)
+            sha256 = await asyncio.to_thread(write_screenshot, screenshot_path, screenshot_bytes)
             
-            # Create screenshot metadata
-            screenshot_info = {
-                "script_name": self.script_name,
-                "step_name": step_name,
-                "description": description,
-                "filename": screenshot_filename,
-                "data": screenshot_data,
-                "timestamp": timestamp.isoformat(),
-                "step_number": self.screenshot_counter
-            }
-            
-            self.screenshots_data.append(screenshot_info)
+            screenshot_info = await self._record(step_name, description, screenshot_path, screenshot_bytes, sha256, timestamp)
             print(f"📸 Screenshot {self.screenshot_counter}: {step_name} - {description}")
             
             return screenshot_info
@@ -98,258 +416,1043 @@ class ScreenshotCapture:
         except Exception as e:
             print(f"❌ Failed to capture screenshot: {e}")
             return None
+    
+    async def collect_hook_screenshots(self):
+        """Record the screenshots runner_hooks.py saved while the script ran"""
+        try:
+            hook_screenshots = await asyncio.to_thread(self._read_hook_screenshots)
+        except Exception as e:
+            print(f"❌ Failed to collect automatic screenshots: {e}")
+            return
+        
+        for screenshot_path, screenshot_bytes, sha256, timestamp in hook_screenshots:
+            self.screenshot_counter += 1
+            # auto_001_page_load.jpg -> page_load
+            step_name = screenshot_path.stem.split("_", 2)[2]
+            await self._record(step_name, "Captured automatically by the runner", screenshot_path, screenshot_bytes, sha256, timestamp)
+        
+        if hook_screenshots:
+            print(f"📸 Collected {len(hook_screenshots)} automatic screenshots for {self.script_name}")
+    
+    async def clear_hook_screenshots(self):
+        """Remove hook screenshots left over from an earlier run, so they are not collected again"""
+        try:
+            await asyncio.to_thread(self._remove_hook_screenshots)
+        except Exception as e:
+            print(f"⚠️ Failed to clear old automatic screenshots: {e}")
+    
+    def _scan_hook_screenshots(self):
+        """Hook screenshot entries in this script's directory; one scandir, no per-file stat beyond DirEntry's"""
+        try:
+            with os.scandir(self.screenshot_dir) as it:
+                return [entry for entry in it if entry.name.startswith(HOOK_SCREENSHOT_PREFIX)]
+        except FileNotFoundError:
+            return []
+    
+    def _remove_hook_screenshots(self):
+        for entry in self._scan_hook_screenshots():
+            os.unlink(entry.path)
+    
+    def _read_hook_screenshots(self):
+        """Hook screenshot paths, contents, hashes and modification times, in capture order"""
+        # Zero-padded step numbers make name order capture order
+        entries = sorted(self._scan_hook_screenshots(), key=lambda entry: entry.name)
+        hook_screenshots = []
+        for entry in entries:
+            screenshot_path = Path(entry.path)
+            screenshot_bytes = screenshot_path.read_bytes()
+            hook_screenshots.append((
+                screenshot_path,
+                screenshot_bytes,
+                hashlib.sha256(screenshot_bytes).hexdigest(),
+                entry.stat().st_mtime
+            ))
+        return hook_screenshots
+    
+    async def _record(self, step_name, description, screenshot_path: Path, screenshot_bytes: bytes, sha256: str, timestamp: float):
+        """Add metadata for a saved screenshot; the image itself is referenced by path and the epoch timestamp formatted once here"""
+        screenshot_info = {
+            "script_name": self.script_name,
+            "step_name": step_name,
+            "description": description,
+            "filename": screenshot_path.name,
+            "path": str(screenshot_path),
+            "format": SCREENSHOT_TYPE,
+            "size": len(screenshot_bytes),
+            "sha256": sha256,
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+            "step_number": self.screenshot_counter
+        }
+        
+        # Legacy consumers can opt back into base64 data embedded in the results
+        if INLINE_SCREENSHOTS:
+            # An image whose data is already in the sink, or in this script's own records (which are appended
+            # together), is referenced by its sha256 instead of repeated
+            if sha256 in _inlined_screenshots or sha256 in self.inlined_hashes:
+                screenshot_info["ref"] = sha256
+            else:
+                # One pass over the bytes; shipping them to another process would cost as much again
+                screenshot_info["data"] = base64.b64encode(screenshot_bytes).decode('ascii')
+                self.inlined_hashes.add(sha256)
+        
+        self.screenshots_data.append(screenshot_info)
+        return screenshot_info
 
-async def run_user_script_with_screenshots(script_path: Path, capture):
-    """Execute the user's actual test script directly with screenshot capture"""
+async def forward_stream(stream, step_name: str, level: str, tail: collections.deque, log_file):
+    """Forward a subprocess output stream to the live logger and its log file, keeping only its tail"""
     try:
-        await live_logger.log("script_execution", f"Starting execution of {script_path.name}", "info")
-        
-        # Simply execute the user's script as-is
-        process = await asyncio.create_subprocess_exec(
-            sys.executable, str(script_path),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=str(script_path.parent.parent)
+        while True:
+            try:
+                line = await stream.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                # Output ended without a final newline
+                line = e.partial
+                if not line:
+                    return
+            except asyncio.LimitOverrunError as e:
+                # A line longer than the stream limit is forwarded in limit-sized pieces
+                line = await stream.read(e.consumed)
+            
+            # The log file gets the raw bytes; each line is decoded exactly once, after trimming, and never for blank lines
+            log_file.write(line)
+            line = line.rstrip()
+            if line:
+                text = line[:OUTPUT_TAIL_LINE_BYTES].decode('utf-8', errors='ignore')
+                if len(line) > OUTPUT_TAIL_LINE_BYTES:
+                    text += "..."
+                tail.append(text)
+                # Lines that arrive between two flushes reach the backend as one log
+                await live_logger.log_output(stream, step_name, text[:500], level)
+    finally:
+        live_logger.end_output(stream)
+
+def script_log_paths(script_name: str):
+    """Files that receive a script's full stdout and stderr"""
+    return {
+        "stdout_log": str(SCRIPT_LOGS_DIR / f"{script_name}.stdout.log"),
+        "stderr_log": str(SCRIPT_LOGS_DIR / f"{script_name}.stderr.log"),
+    }
+
+async def stream_process_output(process, stdout_tail, stderr_tail, log_paths):
+    """Forward both output streams of a script until it exits, writing them in full to its log files"""
+    with open(log_paths["stdout_log"], 'wb') as stdout_file, open(log_paths["stderr_log"], 'wb') as stderr_file:
+        forwarders = asyncio.gather(
+            forward_stream(process.stdout, "script_output", "info", stdout_tail, stdout_file),
+            forward_stream(process.stderr, "script_error", "warning", stderr_tail, stderr_file)
         )
+        exited = asyncio.ensure_future(process.wait())
+        try:
+            await wait_for_script_exit(process, exited)
+            # Children that outlive the script inherit its pipes, so the streams only end once they are stopped
+            await terminate_process_group(process)
+            try:
+                await asyncio.wait_for(forwarders, timeout=OUTPUT_DRAIN_SECONDS)
+            except asyncio.TimeoutError:
+                # A child that left the process group still holds the pipes open
+                print(f"⚠️ Stopped reading output {OUTPUT_DRAIN_SECONDS:.0f}s after the script exited")
+        finally:
+            exited.cancel()
+            if not forwarders.done():
+                forwarders.cancel()
+                await asyncio.gather(forwarders, return_exceptions=True)
+
+async def wait_for_script_exit(process, exited):
+    """Wait for the script itself to exit; process.wait() alone also waits for every holder of its pipes"""
+    while not exited.done() and process.returncode is None:
+        await asyncio.wait({exited}, timeout=PROCESS_POLL_SECONDS)
+
+async def run_user_script_with_screenshots(script_path: Path, capture, interpreters=None):
+    """Execute the user's actual test script directly, returning success, the tail of its output and its log files"""
+    stdout_tail = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+    stderr_tail = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+    log_paths = {}
+    process = None
+    try:
+        await live_logger.log("script_execution", f"Starting execution of {script_path.name}", "info")
         
-        stdout, stderr = await process.communicate()
+        # Simply execute the user's script as-is, on a prewarmed interpreter when available
+        cwd = str(script_path.parent.parent)
+        screenshots_dir = os.path.abspath(capture.screenshot_dir)
+        log_paths = script_log_paths(capture.script_name)
+        try:
+            if interpreters is not None:
+                process = await interpreters.run(script_path, cwd, screenshots_dir)
+            else:
+                process = await asyncio.create_subprocess_exec(
+                    sys.executable, str(WORKER_SCRIPT), str(script_path),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=cwd,
+                    env={**child_env(), "RUNNER_SCREENSHOTS_DIR": screenshots_dir},
+                    limit=STREAM_LINE_LIMIT,
+                    start_new_session=True
+                )
+            
+            # Stream output to disk while the script runs instead of buffering all of it
+            await asyncio.wait_for(
+                stream_process_output(process, stdout_tail, stderr_tail, log_paths),
+                timeout=PER_TASK_TIMEOUT_SECONDS
+            )
+        except asyncio.CancelledError:
+            # Don't leave the script or its browsers running when the run is cancelled
+            if process is not None:
+                await terminate_process_group(process)
+            raise
+        except asyncio.TimeoutError:
+            await terminate_process_group(process)
+            await live_logger.log("script_execution", f"⏰ User script timed out after {PER_TASK_TIMEOUT_SECONDS:.0f}s and was killed", "error")
+            return False, output_tails(stdout_tail, stderr_tail, log_paths)
         
         success = process.returncode == 0
         
         if success:
             await live_logger.log("script_execution", f"✅ User script executed successfully", "success")
-            stdout_msg = stdout.decode('utf-8', errors='ignore')
-            if stdout_msg.strip():
-                await live_logger.log("script_output", f"Script output: {stdout_msg[:500]}...", "info")
         else:
-            await live_logger.log("script_execution", f"❌ User script execution failed", "error")
-            if stderr:
-                error_msg = stderr.decode('utf-8', errors='ignore')
-                await live_logger.log("script_error", f"Error: {error_msg[:500]}...", "error")
-            if stdout:
-                stdout_msg = stdout.decode('utf-8', errors='ignore')
-                await live_logger.log("script_output", f"Output: {stdout_msg[:500]}...", "info")
+            await live_logger.log("script_execution", f"❌ User script execution failed (exit code {process.returncode})", "error")
         
-        return success
+        return success, output_tails(stdout_tail, stderr_tail, log_paths)
         
     except Exception as e:
+        # Never leave a script we stopped supervising running in its own session
+        if process is not None:
+            await terminate_process_group(process)
         await live_logger.log("script_execution", f"❌ Error executing user script: {e}", "error")
+        return False, output_tails(stdout_tail, stderr_tail, log_paths)
+
+async def terminate_process_group(process):
+    """Stop a script and every process it started: SIGTERM its process group, then SIGKILL after a grace period"""
+    if not hasattr(os, "killpg"):
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        return
+    
+    # The group outlives its leader, so it is signalled even when the script itself has already exited
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    
+    if not await process_group_exited(process, TERMINATE_GRACE_SECONDS):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            return
+        await process_group_exited(process, TERMINATE_GRACE_SECONDS)
+
+async def process_group_exited(process, timeout):
+    """Wait up to timeout for a script and every other process in its group to exit"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        # The leader leaves the group once it is reaped, which sets its returncode
+        if process.returncode is not None:
+            try:
+                os.killpg(process.pid, 0)
+            except ProcessLookupError:
+                return True
+        await asyncio.sleep(PROCESS_POLL_SECONDS)
+    return False
+
+class WarmInterpreterPool:
+    """Python interpreters that have already imported Playwright, each waiting to run one script"""
+    
+    def __init__(self, size, scripts_to_run):
+        self.size = size
+        self.remaining = scripts_to_run
+        self.idle = []
+        self.spawning = set()
+        
+    async def _spawn(self):
+        """Start an interpreter that imports Playwright and then waits on stdin for a script"""
+        return await asyncio.create_subprocess_exec(
+            sys.executable, str(WORKER_SCRIPT),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=child_env(),
+            limit=STREAM_LINE_LIMIT,
+            start_new_session=True
+        )
+    
+    async def _replenish(self):
+        """Warm up a replacement interpreter in the background"""
+        process = await self._spawn()
+        self.idle.append(process)
+    
+    def _schedule_replenish(self):
+        """Keep enough interpreters warming for the scripts that are still queued"""
+        while len(self.idle) + len(self.spawning) < min(self.size, self.remaining):
+            task = asyncio.create_task(self._replenish())
+            self.spawning.add(task)
+            task.add_done_callback(self.spawning.discard)
+    
+    def start(self):
+        """Begin warming up the initial interpreters"""
+        self._schedule_replenish()
+    
+    async def run(self, script_path: Path, cwd: str, screenshots_dir: str):
+        """Hand a script to a warm interpreter and return its process"""
+        self.remaining -= 1
+        process = None
+        while self.idle and process is None:
+            candidate = self.idle.pop()
+            if candidate.returncode is None:
+                process = candidate
+        if process is None:
+            process = await self._spawn()
+        self._schedule_replenish()
+        
+        # abspath is pure string work; resolve() would lstat every path component per script
+        job = {"script": os.path.abspath(script_path), "cwd": os.path.abspath(cwd), "screenshots_dir": screenshots_dir}
+        try:
+            process.stdin.write(dumps_json(job) + b"\n")
+            await process.stdin.drain()
+        except (Exception, asyncio.CancelledError):
+            # The interpreter may already hold the job; it must not go on to run the script unsupervised
+            await terminate_process_group(process)
+            raise
+        process.stdin.close()
+        return process
+    
+    async def close(self):
+        """Release interpreters that were never given a script"""
+        if self.spawning:
+            await asyncio.gather(*self.spawning, return_exceptions=True)
+        for process in self.idle:
+            process.stdin.close()
+            await process.wait()
+        self.idle = []
+
+def output_tails(stdout_tail, stderr_tail, log_paths):
+    """Join the captured output tails into result fields, omitting empty streams, next to the full log files"""
+    output = dict(log_paths)
+    if stdout_tail:
+        output["stdout"] = "\n".join(stdout_tail)
+    if stderr_tail:
+        output["stderr"] = "\n".join(stderr_tail)
+    return output
+
+# Top-level `async def run(` or `async def test_...(` at the start of a line; confirmed with ast before use
+_ENTRY_POINT_PATTERN = re.compile(rb"^async[ \t]+def[ \t]+(?:run|test_\w*)[ \t]*\(", re.MULTILINE)
+
+# First parameter names a `test_*` coroutine needs to be called with a shared browser object
+ENTRY_POINT_PARAMETERS = ("page", "context", "ctx", "browser")
+
+def is_entry_point(name: str, parameters):
+    """Coroutines the runner calls in-process: `run` or `test_*` taking a page, context or browser"""
+    if name != "run" and not name.startswith("test_"):
         return False
+    return bool(parameters) and parameters[0] in ENTRY_POINT_PARAMETERS
 
+def is_main_guard(node):
+    """Whether a top-level statement is `if __name__ == "__main__":`"""
+    test = getattr(node, "test", None) if isinstance(node, ast.If) else None
+    return (
+        isinstance(test, ast.Compare)
+        and isinstance(test.left, ast.Name) and test.left.id == "__name__"
+        and len(test.comparators) == 1
+        and isinstance(test.comparators[0], ast.Constant) and test.comparators[0].value == "__main__"
+    )
 
+def is_literal(node):
+    """Whether an expression is a plain constant such as a number, string or list of them"""
+    try:
+        ast.literal_eval(node)
+        return True
+    except (ValueError, TypeError, SyntaxError, RecursionError):
+        return False
 
-async def create_documentation_screenshot(capture):
-    """Create a simple documentation screenshot"""
-    from playwright.async_api import async_playwright
+def is_declarative(body):
+    """Whether statements only import, define functions and classes, and assign constants"""
+    for node in body:
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.Pass)):
+            continue
+        if isinstance(node, ast.ClassDef) and is_declarative(node.body):
+            continue
+        # Docstrings and other bare constants
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+            continue
+        if isinstance(node, (ast.Assign, ast.AnnAssign)) and (node.value is None or is_literal(node.value)):
+            continue
+        return False
+    return True
+
+def is_importable_module(tree):
+    """Whether importing the module runs nothing but declarations: any other top-level code needs its own process"""
+    return is_declarative([node for node in tree.body if not is_main_guard(node)])
+
+def has_async_entry_point(script_path: Path):
+    """Check, without importing it, whether a script defines a top-level `async def run(...)` or `async def test_*(...)`"""
+    try:
+        # Scan the mapped file in place; most scripts are ruled out without copying or parsing them
+        with open(script_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if not _ENTRY_POINT_PATTERN.search(mapped):
+                    return False
+                source = mapped[:]
+        # Only scripts that pass the prefilter pay for the parser
+        tree = ast.parse(source, filename=str(script_path))
+    except (OSError, SyntaxError, ValueError):
+        return False
+    
+    # Top-level code (asyncio.run, sync_playwright, sleeps) would run on the runner's event loop; such a script runs as a subprocess
+    if not is_importable_module(tree):
+        return False
     
+    return any(
+        isinstance(node, ast.AsyncFunctionDef) and is_entry_point(node.name, [arg.arg for arg in node.args.args])
+        for node in tree.body
+    )
+
+# Script imports change sys.path and sys.modules while they run, so they run one at a time
+_script_import_lock = threading.Lock()
+
+def load_script_module(script_path: Path):
+    """Import a user script as a module without running its __main__ block, leaving sys.path and sys.modules as they were"""
+    script_dir = os.path.dirname(os.path.abspath(script_path))
+    module_name = f"_testneo_script_{script_path.stem}"
+    
+    with _script_import_lock:
+        # The script's own directory is importable while its top level runs, as under `python script.py`
+        added_path = script_dir not in sys.path
+        if added_path:
+            sys.path.insert(0, script_dir)
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, script_path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+            return module
+        finally:
+            sys.modules.pop(module_name, None)
+            if added_path:
+                sys.path.remove(script_dir)
+
+def script_entry_points(module):
+    """The module's `run` coroutine, or else its `test_*` coroutines in definition order"""
+    entry_points = [
+        value for name, value in vars(module).items()
+        if inspect.iscoroutinefunction(value) and is_entry_point(name, list(inspect.signature(value).parameters))
+    ]
+    run = [entry_point for entry_point in entry_points if entry_point.__name__ == "run"]
+    return run or entry_points
+
+def entry_point_target(entry_point):
+    """Which shared object an entry point asks for: browser, context or page"""
+    parameters = list(inspect.signature(entry_point).parameters)
+    if parameters and parameters[0] in ("browser", "context", "ctx"):
+        return "context" if parameters[0] == "ctx" else parameters[0]
+    return "page"
+
+async def run_entry_point(entry_point, capture, browser, timeout):
+    """Call one entry point with the browser, or with a fresh context or page on it"""
+    target = entry_point_target(entry_point)
+    
+    # Scripts that manage their own contexts get the browser itself
+    if target == "browser":
+        await asyncio.wait_for(entry_point(browser), timeout=timeout)
+        return
+    
+    context_options = CONTEXT_OPTIONS
+    if RECORD_VIDEO:
+        # Chromium encodes the video itself while the test runs
+        context_options = {
+            **CONTEXT_OPTIONS,
+            "record_video_dir": str(VIDEOS_DIR / capture.script_name),
+            "record_video_size": CONTEXT_OPTIONS["viewport"]
+        }
+    
+    context = await browser.new_context(**context_options)
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-dev-shm-usage', '--window-size=1920,1080']
-            )
-            
-            context = await browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                ignore_https_errors=True
-            )
+        page = await context.new_page()
+        try:
+            await asyncio.wait_for(entry_point(context if target == "context" else page), timeout=timeout)
+        finally:
+            if context.pages:
+                name = entry_point.__name__
+                step_name = "final_state" if name == "run" else f"{name}_final_state"
+                await capture.capture(context.pages[-1], step_name, f"Page state after {name} finished")
+    finally:
+        await context.close()
+
+def failure_details(failures):
+    """Result fields for in-process failures: a one-line error per entry point and their tracebacks as stderr"""
+    return {
+        "error": "; ".join(f"{name}: {e!r}" for name, e in failures),
+        "stderr": "\n".join(
+            "".join(traceback.format_exception(type(e), e, e.__traceback__)).rstrip()
+            for _, e in failures
+        )
+    }
+
+async def run_user_script_in_process(script_path: Path, capture, browser):
+    """Run a script's `async def run(...)` entry point, or each `async def test_*(...)`, against the shared browser, returning success and failure details"""
+    try:
+        await live_logger.log("script_execution", f"Starting in-process execution of {script_path.name}", "info")
+        
+        # Imports are still arbitrary code, so they run off the event loop
+        module = await asyncio.to_thread(load_script_module, script_path)
+        
+        # Every test gets a fresh context; together they share the script's time budget
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + PER_TASK_TIMEOUT_SECONDS
+        failed = []
+        for entry_point in script_entry_points(module):
+            if entry_point.__name__ == "run":
+                await run_entry_point(entry_point, capture, browser, deadline - loop.time())
+                continue
             
+            try:
+                await run_entry_point(entry_point, capture, browser, deadline - loop.time())
+                await live_logger.log("script_execution", f"✅ {entry_point.__name__} passed", "success")
+            except asyncio.TimeoutError:
+                raise
+            except (Exception, SystemExit) as e:
+                failed.append((entry_point.__name__, e))
+                await live_logger.log("script_execution", f"❌ {entry_point.__name__} failed: {e!r}", "error")
+        
+        if failed:
+            await live_logger.log("script_execution", f"❌ User script execution failed: {', '.join(name for name, _ in failed)}", "error")
+            return False, failure_details(failed)
+        
+        await live_logger.log("script_execution", f"✅ User script executed successfully", "success")
+        return True, {}
+        
+    except asyncio.TimeoutError:
+        await live_logger.log("script_execution", f"⏰ User script timed out after {PER_TASK_TIMEOUT_SECONDS:.0f}s", "error")
+        return False, {"error": f"Timed out after {PER_TASK_TIMEOUT_SECONDS:.0f}s"}
+    except (Exception, SystemExit) as e:
+        await live_logger.log("script_execution", f"❌ User script execution failed: {e!r}", "error")
+        return False, failure_details([(script_path.stem, e)])
+
+async def launch_shared_browser():
+    """Start Playwright and launch the browser shared by every test script"""
+    playwright = None
+    try:
+        from playwright.async_api import async_playwright
+        
+        playwright = await async_playwright().start()
+        browser = await playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+        return playwright, browser
+        
+    except Exception as e:
+        print(f"❌ Failed to launch shared browser: {e}")
+        if playwright is not None:
+            await playwright.stop()
+        return None, None
+
+async def close_shared_browser(playwright, browser):
+    """Close the shared browser and stop Playwright"""
+    try:
+        if browser is not None:
+            await browser.close()
+        if playwright is not None:
+            await playwright.stop()
+    except Exception as e:
+        print(f"⚠️ Failed to close shared browser: {e}")
+
+async def create_documentation_screenshot(capture, browser):
+    """Create a simple documentation screenshot"""
+    if browser is None:
+        return
+    
+    try:
+        context = await browser.new_context(**CONTEXT_OPTIONS)
+        
+        try:
             page = await context.new_page()
+            await capture.capture(page, "documentation", f"Test script {capture.script_name} executed")
+        finally:
+            await context.close()
             
-            try:
-                await capture.capture(page, "documentation", f"Test script {capture.script_name} executed")
-            finally:
-                await browser.close()
-                
     except Exception as e:
         print(f"❌ Failed to create documentation screenshot: {e}")
 
-async def run_test_script(script_path: Path, script_name: str):
+async def run_test_script(script_path: Path, script_name: str, browser=None, in_process=False, interpreters=None):
     """Run a test script with enhanced screenshot capture"""
-    print(f"\n{'='*50}")
-    print(f"Running: {script_name}")
-    print(f"{'='*50}")
+    print_block(f"\n{_BAR50}", f"Running: {script_name}", _BAR50)
     
     start_time = datetime.now()
     capture = ScreenshotCapture(script_name)
     
     try:
-        # Execute the user's actual script
-        success = await run_user_script_with_screenshots(script_path, capture)
+        # Execute the user's actual script, in-process when it exposes `async def run(...)`
+        output = {}
+        if browser is not None and in_process:
+            success, output = await run_user_script_in_process(script_path, capture, browser)
+        else:
+            # Every subprocess starts its own browser, so fewer of them run at once; this worker waits for a slot
+            await capture.clear_hook_screenshots()
+            async with get_browser_process_slots():
+                # Time spent queued for a slot is not part of the script's duration
+                start_time = datetime.now()
+                success, output = await run_user_script_with_screenshots(script_path, capture, interpreters)
+            await capture.collect_hook_screenshots()
         
         # Create a simple screenshot for documentation purposes
         if not capture.screenshots_data:
-            await create_documentation_screenshot(capture)
+            await create_documentation_screenshot(capture, browser)
         
         end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
         
-        # Save screenshots to results
-        await save_screenshots_to_results(capture.screenshots_data)
+        # Save screenshots to results; the lock keeps each script's records together in the sink
+        if EMIT_JSON:
+            async with get_results_lock():
+                await save_screenshots_to_results(capture.screenshots_data)
         
-        result = {
-            "script_name": script_name,
-            "status": "success" if success else "failed",
-            "duration": duration,
-            "start_time": start_time.isoformat(),
-            "end_time": end_time.isoformat(),
-            "screenshots_captured": len(capture.screenshots_data)
-        }
+        result = build_result(script_name, success, start_time, end_time, len(capture.screenshots_data), **output)
+        duration = result["duration"]
         
         if success:
             print(f"✅ {script_name} completed successfully in {duration:.2f}s with {len(capture.screenshots_data)} screenshots")
+        elif "error" in output:
+            print(f"❌ {script_name} failed after {duration:.2f}s: {output['error']}")
         else:
             print(f"❌ {script_name} failed after {duration:.2f}s")
         
         return result
         
     except Exception as e:
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
-        
-        result = {
-            "script_name": script_name,
-            "status": "failed",
-            "duration": duration,
-            "start_time": start_time.isoformat(),
-            "end_time": end_time.isoformat(),
-            "error": str(e),
-            "screenshots_captured": len(capture.screenshots_data)
-        }
+        result = build_result(script_name, False, start_time, datetime.now(), len(capture.screenshots_data), error=str(e))
         
         print(f"❌ {script_name} failed with exception: {e}")
         return result
 
-async def save_screenshots_to_results(screenshots_data):
-    """Save screenshots to the results file"""
-    try:
-        results_file = Path("test_results.json")
-        
-        if results_file.exists():
-            with open(results_file, 'r') as f:
-                results = json.load(f)
+class RunTally:
+    """Pass/fail and screenshot counts, updated as each script finishes"""
+    
+    def __init__(self, total):
+        self.total = total
+        self.passed = 0
+        self.failed = 0
+        self.screenshots = 0
+    
+    @property
+    def finished(self):
+        return self.passed + self.failed
+    
+    def record(self, result):
+        if result["status"] == "success":
+            self.passed += 1
         else:
-            results = {"screenshots": []}
+            self.failed += 1
+        self.screenshots += result.get("screenshots_captured", 0)
+
+async def run_script_worker(queue: asyncio.Queue, results: list, tally: RunTally, browser=None, interpreters=None):
+    """Take scripts off the queue and run them one at a time, reporting each result as soon as it is ready"""
+    while not queue.empty():
+        index, script_path, in_process = queue.get_nowait()
+        script_name = script_path.stem
         
-        if "screenshots" not in results:
-            results["screenshots"] = []
+        await live_logger.log("test_start", f"🔄 Starting test: {script_name}", "info")
+        try:
+            result = await run_test_script(script_path, script_name, browser, in_process, interpreters)
+        except Exception as e:
+            result = unfinished_result(script_name, str(e))
         
-        results["screenshots"].extend(screenshots_data)
+        results[index] = result
+        tally.record(result)
         
-        with open(results_file, 'w') as f:
-            json.dump(results, f, indent=2)
+        status_emoji = "✅" if result["status"] == "success" else "❌"
+        await live_logger.log("test_complete", f"{status_emoji} [{tally.finished}/{tally.total}] {script_name} completed in {result['duration']:.2f}s", 
+                             "success" if result["status"] == "success" else "error")
+
+def build_result(script_name: str, success: bool, start_time: datetime, end_time: datetime, screenshots_captured: int, **extra):
+    """Result entry for one script in test_results.json"""
+    return {
+        "script_name": script_name,
+        "status": "success" if success else "failed",
+        "duration": (end_time - start_time).total_seconds(),
+        "start_time": start_time.isoformat(),
+        "end_time": end_time.isoformat(),
+        "screenshots_captured": screenshots_captured,
+        **extra
+    }
+
+def unfinished_result(script_name: str, error: str):
+    """Result for a script that did not run to completion"""
+    now = datetime.now()
+    return build_result(script_name, False, now, now, 0, error=error)
+
+def append_to_sink(lines: bytes):
+    """Append serialized records to the JSONL sink, leaving it unchanged if the write fails; runs in a worker thread"""
+    with open(SCREENSHOTS_SINK, 'ab', buffering=0) as f:
+        start = f.seek(0, os.SEEK_END)
+        try:
+            remaining = memoryview(lines)
+            while remaining:
+                remaining = remaining[f.write(remaining):]
+        except OSError:
+            # Roll back a partial append so no torn record is left for later ones to follow
+            f.truncate(start)
+            raise
+
+async def save_screenshots_to_results(screenshots_data):
+    """Append screenshots to the JSONL sink, one record per line; callers hold the results lock"""
+    if not screenshots_data:
+        return
+    
+    try:
+        lines = b"".join(dumps_json(screenshot) + b"\n" for screenshot in screenshots_data)
+        # Records with inline data can run to megabytes, so they are written off the event loop
+        await asyncio.to_thread(append_to_sink, lines)
+        
+        # Only now can other scripts' records refer to this data
+        _inlined_screenshots.update(screenshot["sha256"] for screenshot in screenshots_data if "data" in screenshot)
         
         print(f"💾 Saved {len(screenshots_data)} screenshots to results")
         
     except Exception as e:
         print(f"❌ Failed to save screenshots: {e}")
 
-async def main():
-    """Main runner function"""
-    await live_logger.log("runner_start", "🚀 Starting Playwright Test Runner - EXECUTING YOUR ACTUAL TEST SCRIPTS", "info")
-    await live_logger.log("runner_info", f"Working directory: {os.getcwd()}", "info")
+def write_results_file(results_file: Path, final_results: dict):
+    """Write test_results.json, copying screenshot records from the JSONL sink without parsing them"""
+    body = dumps_json(final_results)
     
-    # Create directory structure
-    Path("screenshots").mkdir(exist_ok=True)
-    Path("test-results").mkdir(exist_ok=True)
-    Path("videos").mkdir(exist_ok=True)
+    with open(results_file, 'wb') as f:
+        f.write(b'{"screenshots":[')
+        separator = b""
+        
+        # Each sink line is already a serialized record, inline image data included
+        if SCREENSHOTS_SINK.exists():
+            with open(SCREENSHOTS_SINK, 'rb') as sink:
+                for line in sink:
+                    # A record without its newline was torn by a failed write (e.g. a full disk) and is dropped
+                    if not line.endswith(b"\n"):
+                        print(f"⚠️ Skipping incomplete screenshot record in {SCREENSHOTS_SINK}")
+                        continue
+                    line = line.strip()
+                    if line:
+                        f.write(separator)
+                        f.write(line)
+                        separator = b","
+        
+        f.write(b"]}" if body == b"{}" else b"]," + body[1:])
+        f.flush()
+        os.fsync(f.fileno())
+
+# Chromium executables inside a browser's cache directory (<name>-<revision>), by Playwright browser name
+CHROMIUM_EXECUTABLE_PATTERNS = {
+    "chromium": "chrome-linux*/chrome",
+    "chromium-headless-shell": "chrome-linux*/headless_shell",
+}
+
+def playwright_browsers_path():
+    """Directory where Playwright keeps its downloaded browsers"""
+    return Path(os.getenv("PLAYWRIGHT_BROWSERS_PATH") or Path.home() / ".cache" / "ms-playwright")
+
+def required_chromium_revisions():
+    """Chromium builds the installed Playwright launches, as {browser name: revision}, or None when unknown"""
+    spec = importlib.util.find_spec("playwright")
+    if spec is None or spec.origin is None:
+        return None
     
-    # Install Playwright
-    await live_logger.log("browser_install", "📦 Installing Playwright browsers...", "info")
+    # Each Playwright release pins its browser builds in the driver it bundles
+    browsers_file = Path(spec.origin).parent / "driver" / "package" / "browsers.json"
     try:
-        subprocess.run([sys.executable, "-m", "playwright", "install"], check=True, capture_output=True)
-        subprocess.run([sys.executable, "-m", "playwright", "install-deps"], check=True, capture_output=True)
-        await live_logger.log("browser_install", "✅ Playwright browsers installed successfully", "success")
-    except subprocess.CalledProcessError as e:
+        browsers = loads_json(browsers_file.read_bytes())["browsers"]
+        revisions = {
+            browser["name"]: browser["revision"]
+            for browser in browsers if browser["name"] in CHROMIUM_EXECUTABLE_PATTERNS
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return revisions or None
+
+def browser_directory(name: str, revision: str):
+    """Cache directory of one browser build, e.g. chromium_headless_shell-1140"""
+    return playwright_browsers_path() / f"{name.replace('-', '_')}-{revision}"
+
+def browsers_ready_marker(revisions):
+    """Marker file recording that these Chromium revisions are installed"""
+    key = "-".join(f"{name}-{revision}" for name, revision in sorted(revisions.items()))
+    return playwright_browsers_path() / f".testneo-ready-{key}"
+
+def mark_browsers_ready():
+    """Record a working Chromium install so later runs skip the cache scan"""
+    revisions = required_chromium_revisions()
+    if revisions is None:
+        return
+    marker = browsers_ready_marker(revisions)
+    try:
+        marker.touch()
+    except OSError as e:
+        print(f"⚠️ Could not write browser marker {marker}: {e}")
+
+def chromium_installed():
+    """Check whether the Chromium builds this Playwright version needs are already in the browser cache"""
+    # Without the pinned revisions a cached build may be the wrong one, so install (a no-op when it is current)
+    revisions = required_chromium_revisions()
+    if revisions is None:
+        return False
+    
+    # The marker lives inside the cache and names the revisions, so clearing the cache or upgrading Playwright invalidates it
+    if browsers_ready_marker(revisions).exists():
+        return True
+    
+    installed = all(
+        next(browser_directory(name, revision).glob(CHROMIUM_EXECUTABLE_PATTERNS[name]), None) is not None
+        for name, revision in revisions.items()
+    )
+    if installed:
+        mark_browsers_ready()
+    return installed
+
+async def run_playwright_command(*args):
+    """Run a Playwright CLI command without blocking the event loop"""
+    command = " ".join(args)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "playwright", *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        
+        if process.returncode != 0:
+            error_msg = stderr.decode('utf-8', errors='ignore').strip()
+            await live_logger.log("browser_install", f"⚠️ Browser installation warning: playwright {command} exited with {process.returncode}: {error_msg[:500]}", "warning")
+            return False
+        return True
+        
+    except Exception as e:
         await live_logger.log("browser_install", f"⚠️ Browser installation warning: {e}", "warning")
+        return False
+
+# Environment shared by every script subprocess, built on first use
+_child_env = None
+
+def child_env():
+    """Environment for script subprocesses: the runner's own, with unbuffered output"""
+    global _child_env
+    if _child_env is None:
+        # PLAYWRIGHT_BROWSERS_PATH passes through only when set; otherwise scripts use the platform default like the runner
+        env = os.environ.copy()
+        # Line-by-line output reaches the live log while the script runs, not when its buffer fills
+        env["PYTHONUNBUFFERED"] = "1"
+        _child_env = env
+    return _child_env
+
+def find_python_files(directory: Path):
+    """List the .py files directly inside a directory, largest first"""
+    with os.scandir(directory) as it:
+        entries = [entry for entry in it if entry.name.endswith(".py") and entry.is_file()]
+    # File size is a rough proxy for run time; starting long scripts first shortens the tail
+    entries.sort(key=lambda entry: entry.stat().st_size, reverse=True)
+    return [Path(entry.path) for entry in entries]
+
+async def ensure_browsers_installed():
+    """Install Playwright Chromium unless it is already cached"""
+    if await asyncio.to_thread(chromium_installed):
+        await live_logger.log("browser_install", f"✅ Playwright Chromium already installed in {playwright_browsers_path()}", "success")
+        return
     
-    # Find test scripts in scripts directory (where backend pushes them)
+    await live_logger.log("browser_install", "📦 Installing Playwright browsers...", "info")
+    installed = await asyncio.gather(
+        run_playwright_command("install", "chromium"),
+        run_playwright_command("install-deps", "chromium")
+    )
+    if all(installed):
+        await asyncio.to_thread(mark_browsers_ready)
+        await live_logger.log("browser_install", "✅ Playwright browsers installed successfully", "success")
+
+def discover_test_scripts():
+    """Find test scripts, returning the scripts directory (None for the working directory), all .py files and the tests"""
+    # Prefer the scripts directory, where the backend pushes them
     scripts_dir = Path("scripts")
     if scripts_dir.exists():
-        script_files = list(scripts_dir.glob("*.py"))
+        script_files = find_python_files(scripts_dir)
         test_scripts = [f for f in script_files if not f.name.startswith("enhanced_")]
+        return scripts_dir, script_files, test_scripts
+    
+    # Fallback to current directory
+    script_files = find_python_files(Path("."))
+    test_scripts = [f for f in script_files if f.name not in EXCLUDED_SCRIPTS and not f.name.startswith("enhanced_")]
+    return None, script_files, test_scripts
+
+def save_results(results, tally: RunTally, start_time: datetime, end_time: datetime, total_duration: float):
+    """Write test_results.json, and the pretty copy when requested"""
+    results_file = Path("test_results.json")
+    
+    # Screenshots come only from this run's sink; write_results_file copies them in
+    final_results = {
+        "summary": {
+            "total_tests": tally.total,
+            "passed": tally.passed,
+            "failed": tally.failed,
+            "duration": total_duration,
+            "screenshots_captured": tally.screenshots,
+            "start_time": start_time.isoformat(),
+            "end_time": end_time.isoformat()
+        },
+        "results": results,
+        "status": "success" if tally.failed == 0 else "failed"
+    }
+    
+    write_results_file(results_file, final_results)
+    SCREENSHOTS_SINK.unlink(missing_ok=True)
+    
+    print_block(
+        "💾 Results and screenshots saved!",
+        "📸 Screenshots saved to screenshots/ directory",
+        "📋 Results saved to test_results.json"
+    )
+    
+    # Human-readable copy, only on request
+    if PRETTY_RESULTS:
+        with open(results_file, 'rb') as f:
+            final_results = loads_json(f.read())
+        with open(PRETTY_RESULTS_FILE, 'wb') as f:
+            f.write(dumps_json(final_results, indent=True))
+        print(f"📋 Pretty-printed results saved to {PRETTY_RESULTS_FILE}")
+
+async def run_tests():
+    """Discover and execute test scripts, returning the process exit code"""
+    await live_logger.log("runner_start", "🚀 Starting Playwright Test Runner - EXECUTING YOUR ACTUAL TEST SCRIPTS", "info")
+    await live_logger.log("runner_info", f"Working directory: {os.getcwd()}", "info")
+    await live_logger.log("runner_info", f"Usable CPUs: {EFFECTIVE_CPUS} (host reports {os.cpu_count()})", "info")
+    
+    # Start from an empty screenshot sink
+    SCREENSHOTS_SINK.unlink(missing_ok=True)
+    
+    # Create directory structure
+    SCREENSHOTS_DIR.mkdir(exist_ok=True)
+    SCRIPT_LOGS_DIR.mkdir(exist_ok=True)
+    VIDEOS_DIR.mkdir(exist_ok=True)
+    
+    # Check (and if needed install) browsers while the scripts directory is scanned
+    _, (scripts_dir, script_files, test_scripts) = await asyncio.gather(
+        ensure_browsers_installed(),
+        asyncio.to_thread(discover_test_scripts)
+    )
+    if scripts_dir is not None:
         await live_logger.log("script_discovery", f"📁 Found scripts directory with {len(script_files)} files", "info")
     else:
-        # Fallback to current directory
-        script_files = list(Path(".").glob("*.py"))
-        test_scripts = [f for f in script_files if f.name not in ["runner.py"] and not f.name.startswith("enhanced_")]
         await live_logger.log("script_discovery", f"📁 Using current directory with {len(script_files)} files", "info")
     
     if not test_scripts:
         await live_logger.log("script_discovery", "❌ No test scripts found!", "error")
-        sys.exit(1)
+        return 1
     
     script_list = ", ".join([script.name for script in test_scripts])
     await live_logger.log("script_discovery", f"📋 Found {len(test_scripts)} test scripts: {script_list}", "info")
     
-    # Run tests
+    # Find the scripts that can run in-process, once and concurrently, before any of them starts
+    in_process_flags = await asyncio.gather(*(
+        asyncio.to_thread(has_async_entry_point, script_path) for script_path in test_scripts
+    ))
+    in_process_count = sum(in_process_flags)
+    if in_process_count:
+        await live_logger.log("script_discovery", f"⚡ {in_process_count} scripts expose async run() or test_*() and run in-process", "info")
+    
+    # Run tests concurrently on MAX_PARALLEL workers, largest scripts first
     start_time = datetime.now()
-    results = []
+    await live_logger.log("test_schedule", f"⚡ Running up to {MAX_PARALLEL} test scripts in parallel, at most {MAX_BROWSER_PROCESSES} in their own browser", "info")
     
-    for script_path in test_scripts:
-        script_name = script_path.stem
-        await live_logger.log("test_start", f"🔄 Starting test: {script_name}", "info")
-        result = await run_test_script(script_path, script_name)
-        results.append(result)
-        
-        status_emoji = "✅" if result["status"] == "success" else "❌"
-        await live_logger.log("test_complete", f"{status_emoji} {script_name} completed in {result['duration']:.2f}s", 
-                             "success" if result["status"] == "success" else "error")
+    queue = asyncio.Queue()
+    for index, (script_path, in_process) in enumerate(zip(test_scripts, in_process_flags)):
+        queue.put_nowait((index, script_path, in_process))
+    results = [None] * len(test_scripts)
+    tally = RunTally(len(test_scripts))
     
-    end_time = datetime.now()
-    total_duration = (end_time - start_time).total_seconds()
+    # One browser serves in-process scripts and documentation screenshots; each script only gets a fresh context
+    playwright, browser = await launch_shared_browser()
+    worker_count = min(MAX_PARALLEL, len(test_scripts))
     
-    # Generate summary
-    successful = [r for r in results if r["status"] == "success"]
-    failed = [r for r in results if r["status"] == "failed"]
-    total_screenshots = sum(r.get("screenshots_captured", 0) for r in results)
-    
-    print(f"\n{'='*60}")
-    print("📊 TEST EXECUTION SUMMARY")
-    print(f"{'='*60}")
-    print(f"Total Tests: {len(results)}")
-    print(f"✅ Passed: {len(successful)}")
-    print(f"❌ Failed: {len(failed)}")
-    print(f"📸 Screenshots: {total_screenshots}")
-    print(f"⏱️ Total Duration: {total_duration:.2f}s")
-    print(f"{'='*60}")
-    
-    # Save final results
-    results_file = Path("test_results.json")
-    if results_file.exists():
-        with open(results_file, 'r') as f:
-            final_results = json.load(f)
-    else:
-        final_results = {"screenshots": []}
+    # Scripts that run as subprocesses start on interpreters that have already imported Playwright
+    interpreters = None
+    subprocess_count = len(test_scripts) - (in_process_count if browser is not None else 0)
+    if WARM_INTERPRETERS and subprocess_count:
+        interpreters = WarmInterpreterPool(min(worker_count, subprocess_count, MAX_BROWSER_PROCESSES), subprocess_count)
+        interpreters.start()
     
-    final_results.update({
-        "summary": {
-            "total_tests": len(results),
-            "passed": len(successful),
-            "failed": len(failed),
-            "duration": total_duration,
-            "screenshots_captured": total_screenshots,
-            "start_time": start_time.isoformat(),
-            "end_time": end_time.isoformat()
-        },
-        "results": results,
-        "status": "success" if len(failed) == 0 else "failed"
-    })
+    workers = [
+        asyncio.create_task(run_script_worker(queue, results, tally, browser, interpreters))
+        for _ in range(worker_count)
+    ]
     
-    with open(results_file, 'w') as f:
-        json.dump(final_results, f, indent=2)
+    # Subprocess scripts run at most min(workers, browser slots) at a time, and a worker waiting for a slot
+    # runs nothing else, so the bound covers both kinds of script one after the other
+    subprocess_slots = min(worker_count, MAX_BROWSER_PROCESSES)
+    in_process_run_count = len(test_scripts) - subprocess_count
+    rounds = -(-subprocess_count // subprocess_slots) + -(-in_process_run_count // worker_count)
+    gather_timeout = PER_TASK_TIMEOUT_SECONDS * rounds + TASK_GATHER_BUFFER_SECONDS
+    try:
+        _, pending = await asyncio.wait(workers, timeout=gather_timeout)
+        if pending:
+            await live_logger.log("test_timeout", f"⏰ Test run exceeded {gather_timeout:.0f}s, cancelling remaining scripts", "error")
+    finally:
+        # Cancel workers still running after a timeout or an interruption; draining must not be time-bounded
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if interpreters is not None:
+            await interpreters.close()
+        await close_shared_browser(playwright, browser)
+    
+    # Only a cut-off run leaves empty slots to fill
+    if tally.finished < tally.total:
+        for index, script_path in enumerate(test_scripts):
+            if results[index] is None:
+                results[index] = unfinished_result(script_path.stem, f"Timed out after {gather_timeout:.0f}s")
+                tally.record(results[index])
+    
+    end_time = datetime.now()
+    total_duration = (end_time - start_time).total_seconds()
     
-    print(f"💾 Results and screenshots saved!")
-    print(f"📸 Screenshots saved to screenshots/ directory")
-    print(f"📋 Results saved to test_results.json")
+    # Generate summary from the running tally
+    print_block(
+        f"\n{_BAR60}",
+        "📊 TEST EXECUTION SUMMARY",
+        _BAR60,
+        f"Total Tests: {tally.total}",
+        f"✅ Passed: {tally.passed}",
+        f"❌ Failed: {tally.failed}",
+        f"📸 Screenshots: {tally.screenshots}",
+        f"⏱️ Total Duration: {total_duration:.2f}s",
+        _BAR60
+    )
+    
+    # Save final results, unless nothing is going to read them
+    if EMIT_JSON:
+        save_results(results, tally, start_time, end_time, total_duration)
+    else:
+        print("⏭️ Skipping test_results.json (pass --json or set RUNNER_EMIT_JSON=1 to write it)")
     
     # Ensure artifact directories exist
     for directory in ["test-results", "screenshots", "videos"]:
-        dir_path = Path(directory)
-        if not any(dir_path.iterdir()):
-            (dir_path / ".gitkeep").touch()
+        with os.scandir(directory) as entries:
+            if next(entries, None) is None:
+                (Path(directory) / ".gitkeep").touch()
+    
+    return 0 if tally.failed == 0 else 1
+
+async def main():
+    """Main runner function"""
+    # Ctrl-C or a CI cancellation stops the run cleanly, so running scripts get their process groups terminated
+    run_task = asyncio.ensure_future(run_tests())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, run_task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+    
+    try:
+        exit_code = await run_task
+    except asyncio.CancelledError:
+        await live_logger.log("runner_interrupted", "🛑 Test run interrupted, running scripts were stopped", "error")
+        exit_code = 130
+    finally:
+        await live_logger.close()
     
-    sys.exit(0 if len(failed) == 0 else 1)
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
+    # uvloop's libuv event loop, when installed, cuts per-syscall overhead for the streaming and subprocess work
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main()) 
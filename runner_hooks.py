@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Screenshot hooks for USER test scripts run by the Playwright test runner
+Patches Playwright so every navigation and the final page state are captured without touching the script
+"""
+
+import os
+import time
+import weakref
+import itertools
+
+# Prefix of hook screenshot files; the runner collects files starting with it
+HOOK_SCREENSHOT_PREFIX = "auto_"
+
+# Screenshot encoding, shared with runner.py: "jpeg" is much faster to capture and smaller than lossless "png"
+SCREENSHOT_TYPE = os.getenv("SCREENSHOT_TYPE", "jpeg").lower()
+if SCREENSHOT_TYPE not in ("jpeg", "png"):
+    SCREENSHOT_TYPE = "jpeg"
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", "80"))
+SCREENSHOT_EXTENSION = ".jpg" if SCREENSHOT_TYPE == "jpeg" else ".png"
+
+# A capture this soon after the previous one of the same page is skipped (e.g. close right after goto)
+SCREENSHOT_DEBOUNCE_SECONDS = float(os.getenv("RUNNER_SCREENSHOT_DEBOUNCE", "0.5"))
+
+_screenshots_dir = None
+_step_counter = itertools.count(1)
+_last_capture = weakref.WeakKeyDictionary()
+
+def _should_capture(page, step_name):
+    """Navigation is always captured; a final state is skipped when the page was captured moments ago"""
+    now = time.monotonic()
+    last = _last_capture.get(page)
+    _last_capture[page] = now
+    return step_name == "page_load" or last is None or now - last >= SCREENSHOT_DEBOUNCE_SECONDS
+
+def _screenshot_options(step_name):
+    """Screenshot arguments for the next hook capture"""
+    os.makedirs(_screenshots_dir, exist_ok=True)
+    filename = f"{HOOK_SCREENSHOT_PREFIX}{next(_step_counter):03d}_{step_name}{SCREENSHOT_EXTENSION}"
+    options = {"path": os.path.join(_screenshots_dir, filename), "type": SCREENSHOT_TYPE, "full_page": True}
+    if SCREENSHOT_TYPE == "jpeg":
+        options["quality"] = SCREENSHOT_QUALITY
+    return options
+
+def _patch_async_api():
+    """Capture around navigation and page, context and browser close in the asyncio API"""
+    try:
+        from playwright.async_api import Browser, BrowserContext, Page
+    except ImportError:
+        return
+
+    original_goto = Page.goto
+    original_page_close = Page.close
+    original_context_close = BrowserContext.close
+    original_browser_close = Browser.close
+
+    async def capture(page, step_name):
+        try:
+            if not page.is_closed() and _should_capture(page, step_name):
+                await page.screenshot(**_screenshot_options(step_name))
+        except Exception as e:
+            print(f"⚠️ Runner screenshot failed ({step_name}): {e}")
+
+    async def goto(self, *args, **kwargs):
+        response = await original_goto(self, *args, **kwargs)
+        await capture(self, "page_load")
+        return response
+
+    async def page_close(self, *args, **kwargs):
+        await capture(self, "final_state")
+        return await original_page_close(self, *args, **kwargs)
+
+    async def context_close(self, *args, **kwargs):
+        for page in self.pages:
+            await capture(page, "final_state")
+        return await original_context_close(self, *args, **kwargs)
+
+    async def browser_close(self, *args, **kwargs):
+        for context in self.contexts:
+            for page in context.pages:
+                await capture(page, "final_state")
+        return await original_browser_close(self, *args, **kwargs)
+
+    Page.goto = goto
+    Page.close = page_close
+    BrowserContext.close = context_close
+    Browser.close = browser_close
+
+def _patch_sync_api():
+    """Capture around navigation and page, context and browser close in the sync API"""
+    try:
+        from playwright.sync_api import Browser, BrowserContext, Page
+    except ImportError:
+        return
+
+    original_goto = Page.goto
+    original_page_close = Page.close
+    original_context_close = BrowserContext.close
+    original_browser_close = Browser.close
+
+    def capture(page, step_name):
+        try:
+            if not page.is_closed() and _should_capture(page, step_name):
+                page.screenshot(**_screenshot_options(step_name))
+        except Exception as e:
+            print(f"⚠️ Runner screenshot failed ({step_name}): {e}")
+
+    def goto(self, *args, **kwargs):
+        response = original_goto(self, *args, **kwargs)
+        capture(self, "page_load")
+        return response
+
+    def page_close(self, *args, **kwargs):
+        capture(self, "final_state")
+        return original_page_close(self, *args, **kwargs)
+
+    def context_close(self, *args, **kwargs):
+        for page in self.pages:
+            capture(page, "final_state")
+        return original_context_close(self, *args, **kwargs)
+
+    def browser_close(self, *args, **kwargs):
+        for context in self.contexts:
+            for page in context.pages:
+                capture(page, "final_state")
+        return original_browser_close(self, *args, **kwargs)
+
+    Page.goto = goto
+    Page.close = page_close
+    BrowserContext.close = context_close
+    Browser.close = browser_close
+
+def install(screenshots_dir):
+    """Save a screenshot into screenshots_dir after every page.goto and before pages, contexts or browsers close"""
+    global _screenshots_dir
+    if _screenshots_dir is not None or not screenshots_dir:
+        return
+    _screenshots_dir = screenshots_dir
+    _patch_async_api()
+    _patch_sync_api()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Prewarmed interpreter for the Playwright test runner
+Imports Playwright up front, then runs a single USER test script as __main__
+"""
+
+import os
+import sys
+import json
+import runpy
+
+# Pay the asyncio and Playwright import cost before a script is assigned
+import asyncio
+try:
+    import playwright.async_api
+    import playwright.sync_api
+except ImportError:
+    pass
+
+import runner_hooks
+
+def run_script(script_path, cwd=None, screenshots_dir=None):
+    """Run a script the way `python script_path` would, with the runner's screenshot hooks installed"""
+    if cwd:
+        os.chdir(cwd)
+    runner_hooks.install(screenshots_dir)
+    script_path = os.path.abspath(script_path)
+    sys.argv = [script_path]
+    sys.path[0] = os.path.dirname(script_path)
+    runpy.run_path(script_path, run_name="__main__")
+
+def main():
+    """Run the script given on the command line, or wait for one on stdin"""
+    if len(sys.argv) > 1:
+        run_script(sys.argv[1], screenshots_dir=os.getenv("RUNNER_SCREENSHOTS_DIR"))
+        return
+
+    line = sys.stdin.readline()
+    if not line.strip():
+        # The runner shut down without assigning a script
+        return
+
+    job = json.loads(line)
+    run_script(job["script"], job.get("cwd"), job.get("screenshots_dir"))
+
+if __name__ == "__main__":
+    main()